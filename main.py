@@ -3,11 +3,18 @@
 import os
 import asyncio
 import logging
-from fastapi import FastAPI, Request, Response
-from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from types import MappingProxyType
+from fastapi import BackgroundTasks, FastAPI, Request, Response
+from fastapi.responses import ORJSONResponse
 from dotenv import load_dotenv
-import requests
-from discord_interactions import verify_key, InteractionType, InteractionResponseType
+import httpx
+from httpx import HTTPError
+import msgspec
+from async_lru import alru_cache
+from nacl.exceptions import BadSignatureError
+from nacl.signing import VerifyKey
+from discord_interactions import InteractionType, InteractionResponseType
 
 # --- Configuration ---
 load_dotenv()
@@ -15,35 +22,100 @@ PUBLIC_KEY = os.getenv('DISCORD_PUBLIC_KEY')
 BOT_TOKEN = os.getenv('DISCORD_BOT_TOKEN')
 APPLICATION_ID = os.getenv('DISCORD_APPLICATION_ID')
 
+# Constant per-process: build once instead of per command invocation.
+# MappingProxyType guards against accidental mutation of the shared dict.
+BOT_HEADERS = MappingProxyType({"Authorization": f"Bot {BOT_TOKEN}"})
+FOLLOWUP_URL_TMPL = f"https://discord.com/api/v10/webhooks/{APPLICATION_ID}/{{token}}"
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# libsodium-backed Ed25519 is orders of magnitude faster than a pure-Python
+# fallback; build the key object once instead of per request
+_verify_key = VerifyKey(bytes.fromhex(PUBLIC_KEY)) if PUBLIC_KEY else None
+
+def _verify_signature(body: bytes, signature: str, timestamp: str) -> bool:
+    """Checks the Ed25519 signature Discord attaches to every interaction."""
+    if _verify_key is None:
+        return False
+    try:
+        _verify_key.verify(timestamp.encode() + body, bytes.fromhex(signature))
+        return True
+    except (BadSignatureError, ValueError):
+        return False
+
+# --- Inbound Interaction Schema ---
+# Decoding straight into typed structs is faster than generic dicts and
+# replaces per-field hash lookups with attribute access.
+class InteractionOption(msgspec.Struct):
+    value: str
+
+class InteractionData(msgspec.Struct):
+    options: list[InteractionOption] | None = None
+    values: list[str] | None = None
+
+class Interaction(msgspec.Struct):
+    type: int
+    data: InteractionData | None = None
+    token: str | None = None
+
+_decode_interaction = msgspec.json.Decoder(Interaction).decode
+
+# --- Shared HTTP Client ---
+# A single AsyncClient is created on startup and closed on shutdown so all
+# requests share one connection pool instead of paying per-call setup costs.
+http_client: httpx.AsyncClient = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global http_client
+    http_client = httpx.AsyncClient(
+        timeout=10,
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=32, max_connections=200, keepalive_expiry=60),
+    )
+    yield
+    await http_client.aclose()
+
 # --- FastAPI App ---
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
-# --- Reusable Core Logic (Unchanged) ---
-def search_ranobedb(query: str, limit: int = 5):
-    """Searches for books by a query string."""
+# --- Reusable Core Logic ---
+# The cached helpers let errors propagate: alru_cache drops a future that
+# raises, so a transient upstream failure is never served from cache, while
+# concurrent identical calls still coalesce onto the one in-flight future
+# (single-flight) instead of issuing duplicate RanobeDB requests.
+@alru_cache(maxsize=512, ttl=600)
+async def _search_ranobedb_cached(query: str, limit: int):
     api_url = "https://ranobedb.org/api/v0/books"
     params = {'q': query, 'limit': limit, 'sort': 'Release date asc'}
+    response = await http_client.get(api_url, params=params)
+    response.raise_for_status()
+    data = response.json()
+    return data.get('books', [])
+
+async def search_ranobedb(query: str, limit: int = 5):
+    """Searches for books by a query string."""
+    # Normalize the query so "Overlord" and "overlord " share a cache entry
     try:
-        response = requests.get(api_url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        return data.get('books', [])
-    except requests.exceptions.RequestException as e:
-        logger.error(f"API search failed: {e}")
+        return await _search_ranobedb_cached(query.strip().casefold(), limit)
+    except HTTPError as e:
+        logger.error("API search failed: %s", e)
         return []
 
-def get_book_details(book_id: int):
-    """Fetches details for a single book by its ID."""
+@alru_cache(maxsize=1024, ttl=3600)
+async def _get_book_details_cached(book_id: int):
     api_url = f"https://ranobedb.org/api/v0/book/{book_id}"
+    response = await http_client.get(api_url)
+    response.raise_for_status()
+    return response.json()
+
+async def get_book_details(book_id: int):
+    """Fetches details for a single book by its ID."""
     try:
-        response = requests.get(api_url, timeout=10)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        logger.error(f"API detail fetch failed for book ID {book_id}: {e}")
+        return await _get_book_details_cached(book_id)
+    except HTTPError as e:
+        logger.error("API detail fetch failed for book ID %s: %s", book_id, e)
         return None
 
 def create_book_embed(book_data: dict):
@@ -56,29 +128,74 @@ def create_book_embed(book_data: dict):
         "image": {},
         "footer": {"text": "Powered by RanobeDB"}
     }
-    
+
     # Add the description to the main body of the embed
     if description := book_data.get('description'):
         # Increase the character limit before truncating
-        max_len = 1024 
+        max_len = 1024
         if len(description) > max_len:
             embed['description'] = description[:max_len].strip() + "..."
         else:
             embed['description'] = description
 
+    # Release dates arrive as YYYYMMDD integers; integer division/modulo
+    # formats them in one pass without intermediate string slices
+    if release_date := book_data.get('c_release_date'):
+        rd = int(release_date)
+        embed["fields"].append({
+            "name": "Release date",
+            "value": f"{rd // 10000:04d}-{(rd // 100) % 100:02d}-{rd % 100:02d}",
+            "inline": True,
+        })
+
     if image_info := book_data.get('image'):
         if filename := image_info.get('filename'):
             embed["image"]["url"] = f"https://images.ranobedb.org/{filename}"
-    
+
     return embed
 
+def _book_options(books: list):
+    """Builds the dropdown options, avoiding needless string allocations."""
+    # Preallocate rather than append: Discord selects cap at 25 entries, and
+    # this path runs for every multi-result search
+    options = [None] * len(books)
+    for i, book in enumerate(books):
+        title = book.get('title') or 'Unknown Title'
+        lang = book.get('lang') or '?'
+        options[i] = {
+            # Slice only when the label actually exceeds Discord's 100-char cap
+            "label": title if len(title) <= 100 else title[:100],
+            "value": str(book['id']),
+            # Lang codes are usually already uppercase; skip the .upper() copy then
+            "description": "Language: " + (lang if lang.isupper() else lang.upper()),
+        }
+    return options
+
+async def _prefetch_book_details(books: list):
+    """Warms the details cache for every search result concurrently."""
+    await asyncio.gather(*(get_book_details(book['id']) for book in books), return_exceptions=True)
+
+# Cap in-flight follow-ups and keep strong references so tasks aren't
+# garbage-collected mid-send and failures never vanish silently
+_followup_semaphore = asyncio.Semaphore(100)
+_followup_tasks: set = set()
+
+async def _send_followup(followup_url: str, response_data: dict):
+    """Sends a follow-up message to Discord, logging any failure."""
+    async with _followup_semaphore:
+        try:
+            await http_client.post(followup_url, json=response_data, headers=BOT_HEADERS)
+            logger.debug("Followup message sent successfully.")
+        except Exception as e:
+            logger.error("Failed to send followup message: %s", e)
+
 # --- Background Task to process the initial search ---
-async def process_search_command(interaction: dict):
+async def process_search_command(interaction: Interaction):
     """Handles the initial search and sends the follow-up message."""
-    logger.info("DEBUG: Starting background search task.")
-    query = interaction['data']['options'][0]['value']
-    books = await asyncio.to_thread(search_ranobedb, query)
-    followup_url = f"https://discord.com/api/v10/webhooks/{APPLICATION_ID}/{interaction['token']}"
+    logger.debug("Starting background search task.")
+    query = interaction.data.options[0].value
+    books = await search_ranobedb(query)
+    followup_url = FOLLOWUP_URL_TMPL.format(token=interaction.token)
 
     response_data = {}
 
@@ -86,74 +203,93 @@ async def process_search_command(interaction: dict):
         response_data = {"content": f"Sorry, I couldn't find any books matching **{query}**."}
     elif len(books) == 1:
         # If there's one result, we need to fetch its full details for the description
-        logger.info(f"DEBUG: Single result found. Fetching full details for book ID {books[0]['id']}.")
         book_id = books[0]['id']
-        book_details = await asyncio.to_thread(get_book_details, book_id)
-        
+        logger.debug("Single result found. Fetching full details for book ID %s.", book_id)
+        book_details = await get_book_details(book_id)
+
         if book_details and 'book' in book_details:
             embed = create_book_embed(book_details['book'])
             response_data = {"embeds": [embed]}
         else:
             response_data = {"content": "Sorry, I couldn't retrieve the details for that book."}
     else:
+        # Prefetch every result's details while the user reads the dropdown,
+        # so the MESSAGE_COMPONENT handler hits the cache instantly
+        asyncio.create_task(_prefetch_book_details(books))
         # If there are multiple results, create the dropdown as before
-        options = [
-            {"label": book.get('title', 'Unknown Title')[:100], "value": str(book['id']), "description": f"Language: {book.get('lang', '?').upper()}"}
-            for book in books
-        ]
+        options = _book_options(books)
         response_data = {
             "content": "I found several books. Please select one from the list:",
             "components": [{"type": 1, "components": [{"type": 3, "custom_id": "select_book", "options": options, "placeholder": "Choose a book"}]}]
         }
-    
-    headers = {"Authorization": f"Bot {BOT_TOKEN}"}
-    logger.info("DEBUG: Sending followup message to Discord.")
-    try:
-        requests.post(followup_url, json=response_data, headers=headers)
-        logger.info("DEBUG: Followup message sent successfully.")
-    except Exception as e:
-        logger.error(f"DEBUG: Failed to send followup message: {e}")
 
+    logger.debug("Sending followup message to Discord.")
+    # Fire-and-forget: Discord returns no body we care about, so don't let a
+    # slow Discord API response hold up this task
+    task = asyncio.create_task(_send_followup(followup_url, response_data))
+    _followup_tasks.add(task)
+    task.add_done_callback(_followup_tasks.discard)
+
+
+# --- Interaction Handlers ---
+async def _handle_ping(interaction: Interaction, background_tasks: BackgroundTasks):
+    return ORJSONResponse({"type": InteractionResponseType.PONG})
+
+async def _handle_command(interaction: Interaction, background_tasks: BackgroundTasks):
+    # BackgroundTasks ties the task to the request lifecycle, so exceptions
+    # surface through the normal error path instead of vanishing
+    background_tasks.add_task(process_search_command, interaction)
+    return ORJSONResponse({"type": InteractionResponseType.DEFERRED_CHANNEL_MESSAGE_WITH_SOURCE})
+
+async def _handle_component(interaction: Interaction, background_tasks: BackgroundTasks):
+    book_id = int(interaction.data.values[0])
+    book_details = await get_book_details(book_id)
+
+    if book_details and 'book' in book_details:
+        embed = create_book_embed(book_details['book'])
+
+        return ORJSONResponse({
+            "type": InteractionResponseType.UPDATE_MESSAGE,
+            "data": {
+                "content": "", # Set to an empty string to remove the text
+                "embeds": [embed],
+                "components": []
+            }
+        })
+    else:
+        return ORJSONResponse({
+            "type": InteractionResponseType.UPDATE_MESSAGE,
+            "data": { "content": "Sorry, I couldn't retrieve details for that selection.", "components": []}
+        })
+
+async def _handle_unknown(interaction: Interaction, background_tasks: BackgroundTasks):
+    return Response(status_code=404)
+
+# Single dict lookup instead of an if-chain per request
+_INTERACTION_HANDLERS = {
+    InteractionType.PING: _handle_ping,
+    InteractionType.APPLICATION_COMMAND: _handle_command,
+    InteractionType.MESSAGE_COMPONENT: _handle_component,
+}
 
 # --- Main Web Server Endpoint ---
 @app.post("/interactions")
-async def handle_interactions(request: Request):
+async def handle_interactions(request: Request, background_tasks: BackgroundTasks):
     """Handles all incoming interaction requests from Discord."""
     signature = request.headers.get("x-signature-ed25519")
     timestamp = request.headers.get("x-signature-timestamp")
     body = await request.body()
-    if signature is None or timestamp is None or not verify_key(body, signature, timestamp, PUBLIC_KEY):
+    if signature is None or timestamp is None or not _verify_signature(body, signature, timestamp):
         return Response(content="Bad request signature", status_code=401)
 
-    interaction = await request.json()
-    interaction_type = interaction["type"]
-    
-    if interaction_type == InteractionType.PING:
-        return JSONResponse({"type": InteractionResponseType.PONG})
+    # Decode the already-read body straight into the typed struct
+    interaction = _decode_interaction(body)
+    handler = _INTERACTION_HANDLERS.get(interaction.type, _handle_unknown)
+    return await handler(interaction, background_tasks)
 
-    if interaction_type == InteractionType.APPLICATION_COMMAND:
-        asyncio.create_task(process_search_command(interaction))
-        return JSONResponse({"type": InteractionResponseType.DEFERRED_CHANNEL_MESSAGE_WITH_SOURCE})
 
-    if interaction_type == InteractionType.MESSAGE_COMPONENT:
-        book_id = int(interaction['data']['values'][0])
-        book_details = await asyncio.to_thread(get_book_details, book_id)
-        
-        if book_details and 'book' in book_details:
-            embed = create_book_embed(book_details['book'])
-            
-            return JSONResponse({
-                "type": InteractionResponseType.UPDATE_MESSAGE,
-                "data": {
-                    "content": "", # Set to an empty string to remove the text
-                    "embeds": [embed],
-                    "components": [] 
-                }
-            })
-        else:
-            return JSONResponse({
-                "type": InteractionResponseType.UPDATE_MESSAGE,
-                "data": { "content": "Sorry, I couldn't retrieve details for that selection.", "components": []}
-            })
-        
-    return Response(status_code=404)
+if __name__ == "__main__":
+    import uvicorn
+    # uvloop and httptools are picked up automatically once installed, but
+    # request them explicitly so a missing install fails loudly.
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, loop="uvloop", http="httptools")